@@ -4,25 +4,61 @@
 import socket
 import threading
 import time
-import json
+import struct
+import heapq
+import itertools
+import selectors
 import pygame
-from collections import deque
+
+# optional orjson, same fallback as server.py
+try:
+    from orjson import dumps as json_dumps, loads as json_loads
+except ImportError:
+    import json
+    json_dumps = lambda obj: json.dumps(obj).encode()
+    json_loads = json.loads
 
 SERVER_HOST = '127.0.0.1'
 TCP_PORT = 9000
 CLIENT_UDP_PORT = 0          # OS assigns random client port
 CLIENT_LATENCY = 0.1         # 100 ms simulated delay
 INTERPOLATION_DELAY = 0.1    # render ~100ms in past
+SNAPSHOT_BUFFER = 200        # snapshots kept for interpolation
+TEXT_CACHE_SIZE = 64         # rendered labels kept before the cache is reset
+UDP_SOCK_BUF = 4 * 1024 * 1024  # requested SO_RCVBUF / SO_SNDBUF
+MAX_IDLE_WAIT = 0.5          # longest the network loop blocks before rechecking self.running
+INTENT_KEEPALIVE = 1.0       # resend an unchanged intent at least this often (s)
+BASELINE_RETRY = 0.2         # keepalive while waiting for a lost baseline (s)
 
 SCREEN_W, SCREEN_H = 800, 600
 PLAYER_RADIUS = 16
 COIN_RADIUS = 10
 
+# Binary snapshot layout, must match server.py
+MSG_SNAPSHOT = 1                        # full baseline
+MSG_DELTA = 2                           # changes since baseline base_seq
+SNAP_HDR = struct.Struct('<BIdHH')      # type, seq, time, n_players, n_coins
+DELTA_HDR = struct.Struct('<BIIdHHHH')  # type, seq, base_seq, time, n_players,
+                                        # n_removed_players, n_coins, n_removed_coins
+PLAYER = struct.Struct('<IHHi')     # pid, x, y, score
+COIN = struct.Struct('<IHH')        # id, x, y
+ID = struct.Struct('<I')            # removed pid / coin id
+POS_SCALE = 10                      # positions sent as uint16 in 0.1 px units
+MAX_SNAP_SIZE = 65507
+
 
 def current_time():
     return time.time()
 
 
+def set_udp_buffers(sock, size=UDP_SOCK_BUF):
+    # see set_udp_buffers in server.py for the kernel limits on these sizes
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, size)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, size)
+    print("UDP buffers: rcv", sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF),
+          "snd", sock.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF))
+
+
 class Client:
     def __init__(self, server_host):
         pygame.init()
@@ -41,54 +77,94 @@ class Client:
         # UDP for game updates
         self.udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         self.udp.bind(('', CLIENT_UDP_PORT))
+        set_udp_buffers(self.udp)
         self.udp.setblocking(False)
 
         self.running = True
 
-        # Latency queues
-        self.to_send_queue = deque()   # (deliver_time, data, addr)
-        self.inbound_queue = deque()   # (process_time, data)
-
-        # Snapshot interpolation buffer
-        self.snapshots = deque(maxlen=200)
+        # Latency queues: heapq min-heaps keyed on delivery time, with a
+        # counter as tiebreaker. to_send_queue is filled by the render thread
+        # and drained by the network thread, so it is guarded by send_lock.
+        self.to_send_queue = []   # (deliver_time, seq, data, addr)
+        self.inbound_queue = []   # (process_time, seq, data)
+        self.send_lock = threading.Lock()
+        self._queue_seq = itertools.count()
+        # wakes the network thread's select() when a new earliest send is queued
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+
+        # Snapshot interpolation buffer: preallocated ring, oldest slot is
+        # overwritten once SNAPSHOT_BUFFER snapshots have been written
+        self.snapshots = [None] * SNAPSHOT_BUFFER
+        self._snap_times = [0.0] * SNAPSHOT_BUFFER
+        self._snap_write_idx = 0  # total snapshots written so far
+
+        # Delta decoding state
+        self._baseline = None  # (seq, {pid: player}, {coin_id: coin}) last full snapshot
+        self._last_seq = 0     # newest snapshot seq applied; older ones are dropped
+        self._baseline_missing = True  # a delta arrived for a baseline we never got
+
+        # Pre-rendered player shapes and coin
+        self._shape_cache = {}  # (shape_type, is_self) -> Surface
+        self._coin_surface = None
+        self.build_shape_cache()
+
+        # Rendered text surfaces keyed by string
+        self._text_cache = {}
+
+        # Movement keys: (left, alt), (right, alt), (up, alt), (down, alt)
+        self._KEYS_LR = (pygame.K_a, pygame.K_LEFT, pygame.K_d, pygame.K_RIGHT,
+                         pygame.K_w, pygame.K_UP, pygame.K_s, pygame.K_DOWN)
+
+        # Last intent sent; unchanged intents are only resent as keepalives
+        self._last_intent = None
+        self._last_intent_time = 0.0
 
     # ------------------- SHAPE DRAWING -------------------
 
-    def draw_circle(self, x, y, color):
-        pygame.draw.circle(self.screen, color, (int(x), int(y)), PLAYER_RADIUS)
+    def draw_circle(self, surface, x, y, color):
+        pygame.draw.circle(surface, color, (int(x), int(y)), PLAYER_RADIUS)
 
-    def draw_square(self, x, y, color):
+    def draw_square(self, surface, x, y, color):
         size = PLAYER_RADIUS * 2
         rect = pygame.Rect(int(x - PLAYER_RADIUS), int(y - PLAYER_RADIUS), size, size)
-        pygame.draw.rect(self.screen, color, rect)
+        pygame.draw.rect(surface, color, rect)
 
-    def draw_triangle(self, x, y, color):
+    def draw_triangle(self, surface, x, y, color):
         p1 = (x, y - PLAYER_RADIUS)
         p2 = (x - PLAYER_RADIUS, y + PLAYER_RADIUS)
         p3 = (x + PLAYER_RADIUS, y + PLAYER_RADIUS)
-        pygame.draw.polygon(self.screen, color, [p1, p2, p3])
+        pygame.draw.polygon(surface, color, [p1, p2, p3])
 
-    def draw_diamond(self, x, y, color):
+    def draw_diamond(self, surface, x, y, color):
         p1 = (x, y - PLAYER_RADIUS)
         p2 = (x - PLAYER_RADIUS, y)
         p3 = (x, y + PLAYER_RADIUS)
         p4 = (x + PLAYER_RADIUS, y)
-        pygame.draw.polygon(self.screen, color, [p1, p2, p3, p4])
+        pygame.draw.polygon(surface, color, [p1, p2, p3, p4])
+
+    def build_shape_cache(self):
+        # render every (shape_type, is_self) combo once; frames just blit
+        draw_fns = (self.draw_circle, self.draw_square, self.draw_triangle, self.draw_diamond)
+        # primitives reach x/y + PLAYER_RADIUS inclusive, hence the + 1
+        size = PLAYER_RADIUS * 2 + 1
+        for shape_type, draw in enumerate(draw_fns):
+            for is_self in (False, True):
+                color = (0, 200, 255) if is_self else (200, 50, 50)
+                surf = pygame.Surface((size, size), pygame.SRCALPHA)
+                draw(surf, PLAYER_RADIUS, PLAYER_RADIUS, color)
+                self._shape_cache[(shape_type, is_self)] = surf.convert_alpha()
+
+        surf = pygame.Surface((COIN_RADIUS * 2 + 1, COIN_RADIUS * 2 + 1), pygame.SRCALPHA)
+        pygame.draw.circle(surf, (255, 200, 0), (COIN_RADIUS, COIN_RADIUS), COIN_RADIUS)
+        self._coin_surface = surf.convert_alpha()
 
     def draw_shape(self, pid, x, y):
         # consistent shapes for all clients
         pid = int(pid)
-        shape_type = pid % 4
-        color = (0, 200, 255) if pid == self.pid else (200, 50, 50)
-
-        if shape_type == 0:
-            self.draw_circle(x, y, color)
-        elif shape_type == 1:
-            self.draw_square(x, y, color)
-        elif shape_type == 2:
-            self.draw_triangle(x, y, color)
-        elif shape_type == 3:
-            self.draw_diamond(x, y, color)
+        img = self._shape_cache[(pid % 4, pid == self.pid)]
+        self.screen.blit(img, (int(x) - PLAYER_RADIUS, int(y) - PLAYER_RADIUS))
 
     # ------------------- STARTUP -------------------
 
@@ -98,7 +174,7 @@ class Client:
             self.tcp.connect((self.server_host, TCP_PORT))
 
             welcome = self.tcp.recv(4096)
-            msg = json.loads(welcome.decode())
+            msg = json_loads(welcome)
 
             self.pid = msg["pid"]
             self.server_udp_port = msg["udp_port"]
@@ -113,80 +189,169 @@ class Client:
             print("TCP handshake failed:", e)
             return
 
-        # Start UDP threads
-        threading.Thread(target=self.udp_send_loop, daemon=True).start()
-        threading.Thread(target=self.udp_recv_loop, daemon=True).start()
+        # Start the UDP network thread
+        threading.Thread(target=self._net_loop, daemon=True).start()
 
         self.game_loop()
 
     # ------------------- NETWORKING -------------------
 
-    def udp_send_loop(self):
+    def _net_loop(self):
+        # Single thread for both directions: sleep in select() until a
+        # snapshot arrives or the next queued send/receive is due.
+        sel = selectors.DefaultSelector()
+        sel.register(self.udp, selectors.EVENT_READ)
+        sel.register(self._wake_r, selectors.EVENT_READ)
         while self.running:
+            deadline = self.inbound_queue[0][0] if self.inbound_queue else None
+            with self.send_lock:
+                if self.to_send_queue and (deadline is None or self.to_send_queue[0][0] < deadline):
+                    deadline = self.to_send_queue[0][0]
+            timeout = MAX_IDLE_WAIT
+            if deadline is not None:
+                timeout = min(timeout, max(0.0, deadline - current_time()))
+            for key, _ in sel.select(timeout):
+                if key.fileobj is self._wake_r:
+                    try:
+                        while self._wake_r.recv(64):
+                            pass
+                    except BlockingIOError:
+                        pass
+                    continue
+                try:
+                    while True:
+                        data, addr = self.udp.recvfrom(MAX_SNAP_SIZE)
+                        process_time = current_time() + CLIENT_LATENCY
+                        heapq.heappush(self.inbound_queue, (process_time, next(self._queue_seq), data))
+                except BlockingIOError:
+                    pass
+
             now = current_time()
-            while self.to_send_queue and self.to_send_queue[0][0] <= now:
-                _, data, addr = self.to_send_queue.popleft()
+            due = []
+            with self.send_lock:
+                while self.to_send_queue and self.to_send_queue[0][0] <= now:
+                    _, _, data, addr = heapq.heappop(self.to_send_queue)
+                    due.append((data, addr))
+            for data, addr in due:
                 try:
                     self.udp.sendto(data, addr)
                 except:
                     pass
-            time.sleep(0.001)
-
-    def udp_recv_loop(self):
-        while self.running:
-            try:
-                data, addr = self.udp.recvfrom(8192)
-                process_time = current_time() + CLIENT_LATENCY
-                self.inbound_queue.append((process_time, data))
-            except BlockingIOError:
-                pass
 
-            now = current_time()
             while self.inbound_queue and self.inbound_queue[0][0] <= now:
-                _, data = self.inbound_queue.popleft()
+                _, _, data = heapq.heappop(self.inbound_queue)
                 try:
-                    snap = json.loads(data.decode())
-                except:
+                    snap = self.decode_snapshot(data)
+                except struct.error:
                     continue
 
-                if snap.get("type") == "snapshot":
+                if snap is not None:
                     snap["recv_time"] = current_time()
-                    self.snapshots.append(snap)
-
-            time.sleep(0.001)
+                    i = self._snap_write_idx % SNAPSHOT_BUFFER
+                    self.snapshots[i] = snap
+                    self._snap_times[i] = snap["time"]
+                    self._snap_write_idx += 1
+
+    def decode_snapshot(self, data):
+        # returns a full snapshot dict, or None for stale/unusable packets
+        if not data:
+            return None
+        msg_type = data[0]
+        if msg_type == MSG_SNAPSHOT:
+            _, seq, t, n_players, n_coins = SNAP_HDR.unpack_from(data)
+            if seq <= self._last_seq:
+                return None
+            off = SNAP_HDR.size
+            end = off + n_players * PLAYER.size
+            players = {
+                pid: {"x": x / POS_SCALE, "y": y / POS_SCALE, "score": score}
+                for pid, x, y, score in PLAYER.iter_unpack(data[off:end])
+            }
+            off = end
+            end = off + n_coins * COIN.size
+            coins = {cid: {"id": cid, "x": x / POS_SCALE, "y": y / POS_SCALE} for cid, x, y in COIN.iter_unpack(data[off:end])}
+            self._baseline = (seq, players, coins)
+            self._baseline_missing = False
+        elif msg_type == MSG_DELTA:
+            _, seq, base_seq, t, n_players, n_gone_players, n_coins, n_gone_coins = DELTA_HDR.unpack_from(data)
+            if seq <= self._last_seq:
+                return None
+            if self._baseline is None or self._baseline[0] != base_seq:
+                # lost that baseline; send_intent reports it so the server resends
+                self._baseline_missing = True
+                return None
+            _, base_players, base_coins = self._baseline
+            off = DELTA_HDR.size
+            end = off + n_players * PLAYER.size
+            players = dict(base_players)
+            for pid, x, y, score in PLAYER.iter_unpack(data[off:end]):
+                players[pid] = {"x": x / POS_SCALE, "y": y / POS_SCALE, "score": score}
+            off = end
+            end = off + n_gone_players * ID.size
+            for (pid,) in ID.iter_unpack(data[off:end]):
+                players.pop(pid, None)
+            off = end
+            end = off + n_coins * COIN.size
+            coins = dict(base_coins)
+            for cid, x, y in COIN.iter_unpack(data[off:end]):
+                coins[cid] = {"id": cid, "x": x / POS_SCALE, "y": y / POS_SCALE}
+            off = end
+            end = off + n_gone_coins * ID.size
+            for (cid,) in ID.iter_unpack(data[off:end]):
+                coins.pop(cid, None)
+        else:
+            return None
+        self._last_seq = seq
+        return {"type": "snapshot", "time": t, "players": players, "coins": list(coins.values())}
 
     def send_intent(self, intent):
-        msg = {"type": "input", "pid": self.pid, "intent": intent}
-        data = json.dumps(msg).encode()
+        # "baseline" tells the server which full snapshot we hold (0 = none)
+        baseline = self._baseline[0] if self._baseline else 0
+        msg = {"type": "input", "pid": self.pid, "intent": intent, "baseline": baseline}
+        data = json_dumps(msg)
         addr = (self.server_host, self.server_udp_port)
 
         delay_until = current_time() + CLIENT_LATENCY
-        self.to_send_queue.append((delay_until, data, addr))
+        with self.send_lock:
+            new_head = not self.to_send_queue or delay_until < self.to_send_queue[0][0]
+            heapq.heappush(self.to_send_queue, (delay_until, next(self._queue_seq), data, addr))
+        if new_head:
+            # the network thread may be sleeping past delay_until
+            try:
+                self._wake_w.send(b'\0')
+            except OSError:
+                pass
 
     # ------------------- INTERPOLATION -------------------
 
     def get_interpolated_state(self):
-        if not self.snapshots:
+        written = self._snap_write_idx
+        if not written:
             return {}, []
 
         render_time = current_time() - INTERPOLATION_DELAY
-        snaps = list(self.snapshots)
-
-        s0 = None
-        s1 = None
-
-        # Find surrounding snapshots
-        for i in range(len(snaps) - 1):
-            if snaps[i]["time"] <= render_time <= snaps[i + 1]["time"]:
-                s0 = snaps[i]
-                s1 = snaps[i + 1]
-                break
-
-        if s0 is None:
+        count = min(written, SNAPSHOT_BUFFER)
+        start = written - count  # oldest snapshot still in the ring
+        times = self._snap_times
+
+        # Find surrounding snapshots: binary search (oldest -> newest) for
+        # the first snapshot newer than render_time
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if times[(start + mid) % SNAPSHOT_BUFFER] <= render_time:
+                lo = mid + 1
+            else:
+                hi = mid
+
+        if lo == 0 or lo == count:
             # No interpolation possible yet → use last snapshot
-            s = snaps[-1]
+            s = self.snapshots[(written - 1) % SNAPSHOT_BUFFER]
             return s["players"], s["coins"]
 
+        s0 = self.snapshots[(start + lo - 1) % SNAPSHOT_BUFFER]
+        s1 = self.snapshots[(start + lo) % SNAPSHOT_BUFFER]
+
         t0 = s0["time"]
         t1 = s1["time"]
         alpha = (render_time - t0) / (t1 - t0) if t1 > t0 else 1
@@ -207,36 +372,57 @@ class Client:
     # ------------------- RENDERING -------------------
 
     def draw_text(self, text, x, y):
-        img = self.font.render(text, True, (255, 255, 255))
+        # only rasterize when the string changes (e.g. a score update)
+        img = self._text_cache.get(text)
+        if img is None:
+            if len(self._text_cache) >= TEXT_CACHE_SIZE:
+                self._text_cache.clear()
+            img = self.font.render(text, True, (255, 255, 255))
+            self._text_cache[text] = img
         self.screen.blit(img, (x, y))
 
     # ------------------- MAIN LOOP -------------------
 
     def game_loop(self):
+        # hoist attribute lookups out of the per-frame loop
+        tick = self.clock.tick
+        get_events = pygame.event.get
+        get_pressed = pygame.key.get_pressed
+        QUIT = pygame.QUIT
+        L, LA, R, RA, U, UA, D, DA = self._KEYS_LR
+
         while self.running:
-            dt = self.clock.tick(60) / 1000.0
+            dt = tick(60) / 1000.0
 
-            for ev in pygame.event.get():
-                if ev.type == pygame.QUIT:
+            for ev in get_events():
+                if ev.type == QUIT:
                     self.running = False
 
-            keys = pygame.key.get_pressed()
+            k = get_pressed()
             intent = {
-                "left": keys[pygame.K_a] or keys[pygame.K_LEFT],
-                "right": keys[pygame.K_d] or keys[pygame.K_RIGHT],
-                "up": keys[pygame.K_w] or keys[pygame.K_UP],
-                "down": keys[pygame.K_s] or keys[pygame.K_DOWN],
+                "left": k[L] or k[LA],
+                "right": k[R] or k[RA],
+                "up": k[U] or k[UA],
+                "down": k[D] or k[DA],
             }
-            self.send_intent(intent)
+            # the server keeps the last velocity, so only send on change
+            now = current_time()
+            # resend sooner while the server has to learn we lost a baseline
+            keepalive = BASELINE_RETRY if self._baseline_missing else INTENT_KEEPALIVE
+            if intent != self._last_intent or now - self._last_intent_time > keepalive:
+                self.send_intent(intent)
+                self._last_intent = intent
+                self._last_intent_time = now
 
             players, coins = self.get_interpolated_state()
 
             self.screen.fill((18, 18, 18))
 
             # Draw coins
+            coin_img = self._coin_surface
             for c in coins:
-                pygame.draw.circle(
-                    self.screen, (255, 200, 0), (int(c["x"]), int(c["y"])), COIN_RADIUS
+                self.screen.blit(
+                    coin_img, (int(c["x"]) - COIN_RADIUS, int(c["y"]) - COIN_RADIUS)
                 )
 
             # Draw players
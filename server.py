@@ -4,11 +4,27 @@
 import socket
 import threading
 import time
-import json
 import random
 import struct
+import ctypes
+import ctypes.util
+import platform
+import queue
+import heapq
+import itertools
+import selectors
 from collections import deque
 
+import numpy as np
+
+# Use orjson when installed (much faster); both variants take/return bytes.
+try:
+    from orjson import dumps as json_dumps, loads as json_loads
+except ImportError:
+    import json
+    json_dumps = lambda obj: json.dumps(obj).encode()
+    json_loads = json.loads
+
 HOST = '0.0.0.0'
 TCP_PORT = 9000
 UDP_PORT = 9001
@@ -23,17 +39,218 @@ PLAYER_RADIUS = 16
 COIN_RADIUS = 10
 
 MAX_PLAYERS = 2
+PLAYER_ROWS = 16              # initial capacity of the player state arrays
+
+SENDMMSG_BATCH = 64           # max datagrams handed to the kernel per sendmmsg()
+RECVMMSG_BATCH = 32           # max datagrams drained per recvmmsg()
+RECV_BUF_SIZE = 4096
+UDP_SOCK_BUF = 4 * 1024 * 1024  # requested SO_RCVBUF / SO_SNDBUF
+MAX_IDLE_WAIT = 0.5           # longest the UDP loop blocks before rechecking self.running
+# With SO_REUSEPORT (Linux) several sockets share UDP_PORT and the kernel
+# spreads clients across them by 4-tuple hash, one worker thread per socket.
+HAVE_REUSEPORT = platform.system() == "Linux" and hasattr(socket, "SO_REUSEPORT")
+UDP_WORKERS = 2 if HAVE_REUSEPORT else 1
+
+# Binary snapshot layout (little endian), must match client.py.
+# Baseline (full state):
+#   SNAP_HDR, n_players PLAYER, n_coins COIN
+# Delta against the baseline numbered base_seq:
+#   DELTA_HDR, n_players PLAYER (changed/new), n_removed_players ID,
+#   n_coins COIN (added), n_removed_coins ID
+MSG_SNAPSHOT = 1
+MSG_DELTA = 2
+SNAP_HDR = struct.Struct('<BIdHH')      # type, seq, time, n_players, n_coins
+DELTA_HDR = struct.Struct('<BIIdHHHH')  # type, seq, base_seq, time, n_players,
+                                        # n_removed_players, n_coins, n_removed_coins
+PLAYER = struct.Struct('<IHHi')     # pid, x, y, score
+COIN = struct.Struct('<IHH')        # id, x, y
+ID = struct.Struct('<I')            # removed pid / coin id
+POS_SCALE = 10                      # positions sent as uint16 in 0.1 px units
+MAX_SNAP_SIZE = 65507               # largest UDP payload
+SNAP_BUFFERS = 4                    # snapshot buffers preallocated for in-flight sends
+BASELINE_EVERY = 20                 # broadcasts between full snapshots (~1 s)
+BASELINE_GRACE = 0.5                # s a new baseline may still be in flight to clients
 
 def current_time():
     return time.time()
 
+def set_udp_buffers(sock, size=UDP_SOCK_BUF):
+    # Larger kernel buffers absorb bursts instead of silently dropping packets.
+    # Linux caps the request at net.core.rmem_max / wmem_max; raise those with
+    #   sysctl -w net.core.rmem_max=12582912
+    #   sysctl -w net.core.wmem_max=12582912
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, size)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, size)
+    print("UDP buffers: rcv", sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF),
+          "snd", sock.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF))
+
+# ------------------- BATCHED UDP (Linux sendmmsg/recvmmsg) -------------------
+# One sendmmsg()/recvmmsg() call moves a whole batch of datagrams, instead of
+# one sendto()/recvfrom() syscall per packet. Other platforms use the plain calls.
+
+class iovec(ctypes.Structure):
+    _fields_ = [("iov_base", ctypes.c_void_p),
+                ("iov_len", ctypes.c_size_t)]
+
+class sockaddr_in(ctypes.Structure):
+    _fields_ = [("sin_family", ctypes.c_ushort),
+                ("sin_port", ctypes.c_uint16),     # network byte order
+                ("sin_addr", ctypes.c_uint32),     # network byte order
+                ("sin_zero", ctypes.c_char * 8)]
+
+class msghdr(ctypes.Structure):
+    _fields_ = [("msg_name", ctypes.c_void_p),
+                ("msg_namelen", ctypes.c_uint32),
+                ("msg_iov", ctypes.POINTER(iovec)),
+                ("msg_iovlen", ctypes.c_size_t),
+                ("msg_control", ctypes.c_void_p),
+                ("msg_controllen", ctypes.c_size_t),
+                ("msg_flags", ctypes.c_int)]
+
+class mmsghdr(ctypes.Structure):
+    _fields_ = [("msg_hdr", msghdr),
+                ("msg_len", ctypes.c_uint)]
+
+def _load_libc():
+    if platform.system() != "Linux":
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.sendmmsg.argtypes = [ctypes.c_int, ctypes.POINTER(mmsghdr), ctypes.c_uint, ctypes.c_int]
+        libc.sendmmsg.restype = ctypes.c_int
+        libc.recvmmsg.argtypes = [ctypes.c_int, ctypes.POINTER(mmsghdr), ctypes.c_uint, ctypes.c_int, ctypes.c_void_p]
+        libc.recvmmsg.restype = ctypes.c_int
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+_libc = _load_libc()
+MSG_DONTWAIT = getattr(socket, "MSG_DONTWAIT", 0x40)
+
+def fill_sockaddr(sa, addr):
+    ip, port = addr
+    sa.sin_family = socket.AF_INET
+    sa.sin_port = socket.htons(port)
+    sa.sin_addr = struct.unpack('=I', socket.inet_aton(ip))[0]
+
+def make_udp_sock():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if HAVE_REUSEPORT:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((HOST, UDP_PORT))
+    set_udp_buffers(sock)
+    sock.setblocking(False)
+    return sock
+
+def buffer_address(data):
+    # bytes are immutable, so ctypes can point at them directly; writable
+    # buffers (bytearray / memoryview slices of one) go through from_buffer
+    if isinstance(data, bytes):
+        return ctypes.cast(data, ctypes.c_void_p).value
+    return ctypes.addressof(ctypes.c_char.from_buffer(data))
+
+def addr_from_sockaddr(sa):
+    return (socket.inet_ntoa(struct.pack('=I', sa.sin_addr)), socket.ntohs(sa.sin_port))
+
+class MMsgSender:
+    # Preallocated mmsghdr/iovec/sockaddr arrays; only the per-packet
+    # pointers and addresses are rewritten on each send().
+    def __init__(self, batch=SENDMMSG_BATCH):
+        self.batch = batch
+        self.msgs = (mmsghdr * batch)()
+        self.iovs = (iovec * batch)()
+        self.iov_ptrs = [ctypes.pointer(self.iovs[i]) for i in range(batch)]
+        self.addrs = (sockaddr_in * batch)()
+        for i in range(batch):
+            hdr = self.msgs[i].msg_hdr
+            hdr.msg_name = ctypes.addressof(self.addrs[i])
+            hdr.msg_namelen = ctypes.sizeof(sockaddr_in)
+            hdr.msg_iov = self.iov_ptrs[i]
+            hdr.msg_iovlen = 1
+
+    def send(self, sock, payloads):
+        # payloads: list of (data, addrs). Every datagram of one payload points
+        # at the same iovec, so its bytes are referenced once, never copied;
+        # only msg_name (the destination) differs between them.
+        if _libc is None:
+            for data, addrs in payloads:
+                for addr in addrs:
+                    try:
+                        sock.sendto(data, addr)
+                    except Exception:
+                        # ignore send errors
+                        pass
+            return
+        fd = sock.fileno()
+        n = 0      # messages filled in this batch
+        n_iov = 0  # iovecs filled in this batch
+        for data, addrs in payloads:
+            iov = None
+            for addr in addrs:
+                if n == self.batch:
+                    self.flush(fd, n)
+                    n = n_iov = 0
+                    iov = None
+                if iov is None:
+                    iov = n_iov
+                    n_iov += 1
+                    self.iovs[iov].iov_base = buffer_address(data)
+                    self.iovs[iov].iov_len = len(data)
+                self.msgs[n].msg_hdr.msg_iov = self.iov_ptrs[iov]
+                fill_sockaddr(self.addrs[n], addr)
+                n += 1
+        if n:
+            self.flush(fd, n)
+
+    def flush(self, fd, count):
+        i = 0
+        while i < count:
+            sent = _libc.sendmmsg(fd, ctypes.byref(self.msgs[i]), count - i, 0)
+            # on error the first datagram failed: drop it (like sendto) and go on
+            i += sent if sent > 0 else 1
+
+class MMsgReceiver:
+    # Preallocated receive buffers, source addresses and mmsghdr array, so
+    # draining the socket does no per-call ctypes allocation.
+    def __init__(self, batch=RECVMMSG_BATCH, bufsize=RECV_BUF_SIZE):
+        self.batch = batch
+        self.bufsize = bufsize
+        self.msgs = (mmsghdr * batch)()
+        self.iovs = (iovec * batch)()
+        self.addrs = (sockaddr_in * batch)()
+        self.bufs = [ctypes.create_string_buffer(bufsize) for _ in range(batch)]
+        for i in range(batch):
+            self.iovs[i].iov_base = ctypes.addressof(self.bufs[i])
+            self.iovs[i].iov_len = bufsize
+            hdr = self.msgs[i].msg_hdr
+            hdr.msg_name = ctypes.addressof(self.addrs[i])
+            hdr.msg_iov = ctypes.pointer(self.iovs[i])
+            hdr.msg_iovlen = 1
+
+    def recv(self, sock):
+        # returns a list of (data, addr); empty if nothing is pending
+        if _libc is None:
+            try:
+                return [sock.recvfrom(self.bufsize)]
+            except BlockingIOError:
+                return []
+        namelen = ctypes.sizeof(sockaddr_in)
+        for i in range(self.batch):
+            # the kernel overwrites msg_namelen with the actual address length
+            self.msgs[i].msg_hdr.msg_namelen = namelen
+        # MSG_DONTWAIT: return whatever is queued rather than waiting for a full batch
+        n = _libc.recvmmsg(sock.fileno(), self.msgs, self.batch, MSG_DONTWAIT, None)
+        if n <= 0:
+            return []
+        return [(ctypes.string_at(self.bufs[i], self.msgs[i].msg_len), addr_from_sockaddr(self.addrs[i]))
+                for i in range(n)]
+
+# Player metadata only; position and velocity live in the Server's
+# _px/_py/_vx/_vy arrays at row player_index[pid].
 class Player:
     def __init__(self, pid):
         self.id = pid
-        self.x = random.uniform(50, WORLD_W-50)
-        self.y = random.uniform(50, WORLD_H-50)
-        self.vx = 0.0
-        self.vy = 0.0
         self.score = 0
         self.last_input_time = 0.0
         self.addr = None  # (ip, port) for UDP
@@ -45,27 +262,66 @@ class Server:
         self.tcp_sock.bind((HOST, TCP_PORT))
         self.tcp_sock.listen(5)
 
-        self.udp_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.udp_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        self.udp_sock.bind((HOST, UDP_PORT))
-        self.udp_sock.setblocking(False)
+        self.udp_socks = [make_udp_sock() for _ in range(UDP_WORKERS)]
+        self._send_rr = 0  # round-robin index into udp_socks for sends
 
         self.players = {}  # pid -> Player
+        # Player physics state as parallel arrays (structure of arrays).
+        # Rows 0..len(self._rows)-1 are live; player_index maps pid -> row.
+        self._px = np.zeros(PLAYER_ROWS)
+        self._py = np.zeros(PLAYER_ROWS)
+        self._vx = np.zeros(PLAYER_ROWS)
+        self._vy = np.zeros(PLAYER_ROWS)
+        self._rows = []         # row -> Player
+        self.player_index = {}  # pid -> row
         self.next_pid = 1
         self.coins = []    # list of dicts {x,y,id}
+        # coin positions as arrays, kept in the same order as self.coins
+        self._cx = np.empty(0)
+        self._cy = np.empty(0)
         self.coin_next_id = 1
 
+        # lock guards the world state (players, coins); pid_lock only guards
+        # next_pid. Hold self.lock for short critical sections only.
         self.lock = threading.Lock()
+        self.pid_lock = threading.Lock()
         self.running = True
 
+        # decoded intents from the UDP thread, applied at the start of a tick
+        self.intent_queue = queue.Queue()  # (pid, addr, vx, vy, input_time)
+
         # Queues to simulate latency (process inbound after delay)
-        self.inbound_queue = deque()   # (process_time, (data, addr))
-        self.outbound_queue = deque()  # (send_time, (data, addr))
+        # Both are heapq min-heaps keyed on delivery time; the counter breaks
+        # ties so entries never compare their payloads. Each UDP worker keeps
+        # its own inbound queue; outbound_queue is shared (out_lock) and
+        # drained by the first worker.
+        self.outbound_queue = []  # (send_time, seq, data, addrs)
+        self.out_lock = threading.Lock()
+        self._queue_seq = itertools.count()
+        # wakes the sending UDP worker's select() when a new earliest send is queued
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+        self.sender = MMsgSender()
+        # Snapshot encode buffers. Each broadcast packs into one of these and
+        # queues a memoryview of it (no copy); the UDP loop hands the buffer
+        # back once the datagrams are in the kernel.
+        self._free_snap_bufs = deque(bytearray(MAX_SNAP_SIZE) for _ in range(SNAP_BUFFERS))
+        # Delta encoding: deltas are taken against the last baseline (not the
+        # previous broadcast) so a lost delta never corrupts later ones.
+        self._snap_seq = 0
+        self._baseline = None         # (seq, {pid: (x, y, score)}, {coin_id: (x, y)})
+        self._baseline_addrs = set()  # recipients of the current baseline
+        self._baseline_time = 0.0
+        # set when a client reports an older baseline than the current one,
+        # i.e. it lost a baseline; the broadcaster then sends a fresh one
+        self._baseline_requested = False
 
     def start(self):
-        print("Server starting. TCP on", TCP_PORT, "UDP on", UDP_PORT)
+        print("Server starting. TCP on", TCP_PORT, "UDP on", UDP_PORT, f"({len(self.udp_socks)} UDP workers)")
         threading.Thread(target=self.tcp_accept_loop, daemon=True).start()
-        threading.Thread(target=self.udp_recv_loop, daemon=True).start()
+        for i, sock in enumerate(self.udp_socks):
+            threading.Thread(target=self.udp_recv_loop, args=(sock, i == 0), daemon=True).start()
         threading.Thread(target=self.main_loop, daemon=True).start()
         threading.Thread(target=self.broadcaster_loop, daemon=True).start()
         try:
@@ -85,21 +341,22 @@ class Server:
     def handle_tcp_client(self, conn, addr):
         with conn:
             # assign pid
-            with self.lock:
+            with self.pid_lock:
                 pid = self.next_pid
                 self.next_pid += 1
-                p = Player(pid)
-                self.players[pid] = p
+            p = Player(pid)
+            with self.lock:
+                self.add_player(p)
             # send assignment and UDP port
             payload = {"type":"welcome","pid":pid,"udp_port":UDP_PORT}
-            conn.sendall(json.dumps(payload).encode())
+            conn.sendall(json_dumps(payload))
             print(f"Assigned player {pid}")
             # simple blocking: wait until game start: server auto-start when MAX_PLAYERS connected
             while self.running:
                 with self.lock:
                     if len(self.players) >= MAX_PLAYERS:
                         start_msg = {"type":"start","msg":"game starting"}
-                        conn.sendall(json.dumps(start_msg).encode())
+                        conn.sendall(json_dumps(start_msg))
                         break
                 time.sleep(0.1)
             # keep TCP alive until client disconnects
@@ -110,62 +367,122 @@ class Server:
                 pass
             with self.lock:
                 if pid in self.players:
-                    del self.players[pid]
+                    self.remove_player(pid)
                     print(f"Player {pid} disconnected (TCP)")
 
-    # UDP: receive inputs, but simulate SERVER_LATENCY on processing
-    def udp_recv_loop(self):
+    # Player rows; callers hold self.lock
+    def add_player(self, p):
+        row = len(self._rows)
+        if row == len(self._px):
+            # out of rows: double every array
+            self._px, self._py, self._vx, self._vy = (
+                np.concatenate((a, np.zeros(len(a)))) for a in (self._px, self._py, self._vx, self._vy))
+        self._px[row] = random.uniform(50, WORLD_W-50)
+        self._py[row] = random.uniform(50, WORLD_H-50)
+        self._vx[row] = 0.0
+        self._vy[row] = 0.0
+        self._rows.append(p)
+        self.player_index[p.id] = row
+        self.players[p.id] = p
+
+    def remove_player(self, pid):
+        # move the last row into the freed one so live rows stay contiguous
+        row = self.player_index.pop(pid)
+        del self.players[pid]
+        last = len(self._rows) - 1
+        if row != last:
+            moved = self._rows[last]
+            self._rows[row] = moved
+            self.player_index[moved.id] = row
+            for a in (self._px, self._py, self._vx, self._vy):
+                a[row] = a[last]
+        self._rows.pop()
+
+    # UDP: receive inputs, but simulate SERVER_LATENCY on processing.
+    # One thread per socket; the one with sends=True also flushes outbound_queue.
+    def udp_recv_loop(self, sock, sends):
+        receiver = MMsgReceiver()
+        inbound_queue = []   # (process_time, seq, data, addr)
+        sel = selectors.DefaultSelector()
+        sel.register(sock, selectors.EVENT_READ)
+        if sends:
+            sel.register(self._wake_r, selectors.EVENT_READ)
         while self.running:
-            try:
-                data, addr = self.udp_sock.recvfrom(4096)
-                # enqueue for processing later
-                process_time = current_time() + SERVER_LATENCY
-                self.inbound_queue.append((process_time, (data, addr)))
-            except BlockingIOError:
-                pass
+            # block until a packet arrives or the next queued item is due
+            deadline = inbound_queue[0][0] if inbound_queue else None
+            if sends:
+                with self.out_lock:
+                    if self.outbound_queue and (deadline is None or self.outbound_queue[0][0] < deadline):
+                        deadline = self.outbound_queue[0][0]
+            timeout = MAX_IDLE_WAIT
+            if deadline is not None:
+                timeout = min(timeout, max(0.0, deadline - current_time()))
+            for key, _ in sel.select(timeout):
+                if key.fileobj is self._wake_r:
+                    try:
+                        while self._wake_r.recv(64):
+                            pass
+                    except BlockingIOError:
+                        pass
+                    continue
+                packets = receiver.recv(sock)
+                if packets:
+                    # enqueue for processing later
+                    process_time = current_time() + SERVER_LATENCY
+                    for data, addr in packets:
+                        heapq.heappush(inbound_queue, (process_time, next(self._queue_seq), data, addr))
             # process inbound queue items whose time has arrived
             now = current_time()
-            while self.inbound_queue and self.inbound_queue[0][0] <= now:
-                _, (data, addr) = self.inbound_queue.popleft()
+            while inbound_queue and inbound_queue[0][0] <= now:
+                _, _, data, addr = heapq.heappop(inbound_queue)
                 try:
-                    msg = json.loads(data.decode())
+                    msg = json_loads(data)
                 except:
                     continue
                 # Expect messages: {"type":"input","pid":..., "intent":{...}, "udp_port":...}
                 if msg.get("type") == "input":
                     pid = msg.get("pid")
+                    # clients echo the baseline seq they hold
+                    held = msg.get("baseline")
+                    base = self._baseline
+                    if (held is not None and base is not None and held != base[0]
+                            and current_time() - self._baseline_time > BASELINE_GRACE):
+                        self._baseline_requested = True
                     intent = msg.get("intent", {})
-                    with self.lock:
-                        p = self.players.get(pid)
-                        if p:
-                            # register UDP addr if not set
-                            p.addr = addr
-                            # apply as instantaneous velocity vector (server authoritative)
-                            vx = 0.0; vy = 0.0
-                            if intent.get("left"): vx -= 1
-                            if intent.get("right"): vx += 1
-                            if intent.get("up"): vy -= 1
-                            if intent.get("down"): vy += 1
-                            # normalize
-                            mag = (vx*vx + vy*vy) ** 0.5
-                            if mag > 0:
-                                p.vx = (vx/mag) * PLAYER_SPEED
-                                p.vy = (vy/mag) * PLAYER_SPEED
-                            else:
-                                p.vx = 0.0; p.vy = 0.0
-                            p.last_input_time = current_time()
+                    # turn intent into a velocity vector (server authoritative);
+                    # main_loop applies it without this thread taking self.lock
+                    vx = 0.0; vy = 0.0
+                    if intent.get("left"): vx -= 1
+                    if intent.get("right"): vx += 1
+                    if intent.get("up"): vy -= 1
+                    if intent.get("down"): vy += 1
+                    # normalize
+                    mag = (vx*vx + vy*vy) ** 0.5
+                    if mag > 0:
+                        vx = (vx/mag) * PLAYER_SPEED
+                        vy = (vy/mag) * PLAYER_SPEED
+                    self.intent_queue.put((pid, addr, vx, vy, current_time()))
                 # ignore other types
 
-            # process outbound queue send times
-            now = current_time()
+            if sends:
+                self.flush_outbound()
+
+    def flush_outbound(self):
+        # process outbound queue send times: submit everything due in one batch
+        now = current_time()
+        due = []
+        with self.out_lock:
             while self.outbound_queue and self.outbound_queue[0][0] <= now:
-                _, (data, addr) = self.outbound_queue.popleft()
-                try:
-                    self.udp_sock.sendto(data, addr)
-                except Exception as e:
-                    # ignore send errors
-                    pass
-            time.sleep(0.001)
+                _, _, data, addrs = heapq.heappop(self.outbound_queue)
+                due.append((data, addrs))
+        if due:
+            # all sockets share UDP_PORT, so clients see the same source port
+            sock = self.udp_socks[self._send_rr % len(self.udp_socks)]
+            self._send_rr += 1
+            self.sender.send(sock, due)
+            for data, _ in due:
+                # sent (or dropped): the snapshot buffer can be reused
+                self._free_snap_bufs.append(data.obj)
 
     # Main game loop: update physics and handle coin collisions
     def main_loop(self):
@@ -175,14 +492,33 @@ class Server:
             now = current_time()
             dt = now - prev
             prev = now
+            intents = []
+            while True:
+                try:
+                    intents.append(self.intent_queue.get_nowait())
+                except queue.Empty:
+                    break
             with self.lock:
-                # update player positions
-                for p in list(self.players.values()):
-                    p.x += p.vx * dt
-                    p.y += p.vy * dt
-                    # bounds
-                    p.x = max(10, min(WORLD_W-10, p.x))
-                    p.y = max(10, min(WORLD_H-10, p.y))
+                # apply buffered intents in arrival order
+                for pid, addr, vx, vy, input_time in intents:
+                    row = self.player_index.get(pid)
+                    if row is not None:
+                        p = self._rows[row]
+                        # register UDP addr if not set
+                        p.addr = addr
+                        self._vx[row] = vx
+                        self._vy[row] = vy
+                        p.last_input_time = input_time
+                # update player positions, vectorized over all live rows
+                players = self._rows
+                n = len(players)
+                px = self._px[:n]
+                py = self._py[:n]
+                px += self._vx[:n] * dt
+                py += self._vy[:n] * dt
+                # bounds
+                np.clip(px, 10, WORLD_W-10, out=px)
+                np.clip(py, 10, WORLD_H-10, out=py)
                 # spawn coins occasionally
                 coin_spawn_timer += dt
                 if coin_spawn_timer >= 2.0:  # spawn every ~2 seconds
@@ -192,22 +528,32 @@ class Server:
                     coin = {"id": self.coin_next_id, "x": cx, "y": cy}
                     self.coin_next_id += 1
                     self.coins.append(coin)
+                    self._cx = np.append(self._cx, cx)
+                    self._cy = np.append(self._cy, cy)
 
-                # collisions: player-coin
-                to_remove = []
-                for coin in self.coins:
-                    for p in self.players.values():
-                        dx = coin["x"] - p.x
-                        dy = coin["y"] - p.y
-                        if (dx*dx + dy*dy) <= (PLAYER_RADIUS + COIN_RADIUS)**2:
-                            # award score, remove coin
-                            p.score += 1
-                            to_remove.append(coin)
-                            break
+                # collisions: player-coin, all pairs in one broadcasted op
+                # (rows = coins, columns = players)
+                to_remove = set()   # coin ids
+                hit_rows = []
+                if n and self.coins:
+                    dx = self._cx[:, None] - px[None, :]
+                    dy = self._cy[:, None] - py[None, :]
+                    hits = np.argwhere(dx*dx + dy*dy <= (PLAYER_RADIUS + COIN_RADIUS)**2)
+                    # argwhere is row-major, so the first hit per coin is the
+                    # first player in iteration order, as before
+                    for ci, pi in hits.tolist():
+                        if hit_rows and hit_rows[-1] == ci:
+                            continue
+                        # award score, remove coin
+                        players[pi].score += 1
+                        to_remove.add(self.coins[ci]["id"])
+                        hit_rows.append(ci)
                 if to_remove:
-                    for c in to_remove:
-                        if c in self.coins:
-                            self.coins.remove(c)
+                    keep = np.ones(len(self.coins), dtype=bool)
+                    keep[hit_rows] = False
+                    self._cx = self._cx[keep]
+                    self._cy = self._cy[keep]
+                    self.coins = [c for c in self.coins if c["id"] not in to_remove]
             time.sleep(max(0, 1.0 / TICK_RATE - 0.0001))
 
     # Periodic broadcaster: send authoritative snapshot to all players at BROADCAST_HZ
@@ -215,24 +561,102 @@ class Server:
         interval = 1.0 / BROADCAST_HZ
         while self.running:
             t0 = current_time()
+            # copy the state under a brief lock, encode without holding it
             with self.lock:
-                snapshot = {
-                    "type": "snapshot",
-                    "time": current_time(),
-                    "players": {pid: {"x":p.x,"y":p.y,"score":p.score} for pid,p in self.players.items()},
-                    "coins": [{"id":c["id"],"x":c["x"],"y":c["y"]} for c in self.coins]
-                }
-                data = json.dumps(snapshot).encode()
-                # enqueue sends with SERVER_LATENCY (simulate send delay)
-                send_time = current_time() + SERVER_LATENCY
-                for p in self.players.values():
-                    if p.addr:
-                        self.outbound_queue.append((send_time, (data, p.addr)))
+                snap_time = current_time()
+                n = len(self._rows)
+                players = [(p.id, x, y, p.score, p.addr)
+                           for p, x, y in zip(self._rows, self._px[:n].tolist(), self._py[:n].tolist())]
+                coins = list(self.coins)
+            # drop coins that would not fit into a single datagram
+            room = (MAX_SNAP_SIZE - SNAP_HDR.size - len(players) * PLAYER.size) // COIN.size
+            # quantize positions; deltas then also skip sub-0.1px movement
+            players_state = {pid: (round(x * POS_SCALE), round(y * POS_SCALE), score)
+                             for pid, x, y, score, _ in players}
+            coins_state = {c["id"]: (round(c["x"] * POS_SCALE), round(c["y"] * POS_SCALE))
+                           for c in coins[:max(0, room)]}
+            addrs = {addr for *_, addr in players if addr}
+
+            self._snap_seq += 1
+            seq = self._snap_seq
+            off = None
+            base = self._baseline
+            # reuse a returned buffer; only allocate if every one is still queued
+            buf = self._free_snap_bufs.popleft() if self._free_snap_bufs else bytearray(MAX_SNAP_SIZE)
+            # new recipients, or a client that lost the baseline, need a fresh
+            # one before deltas mean anything
+            if (base is not None and seq - base[0] < BASELINE_EVERY
+                    and addrs <= self._baseline_addrs and not self._baseline_requested):
+                off = self.pack_delta(buf, seq, base, snap_time, players_state, coins_state)
+            if off is None:
+                off = self.pack_baseline(buf, seq, snap_time, players_state, coins_state)
+                self._baseline = (seq, players_state, coins_state)
+                self._baseline_addrs = addrs
+                self._baseline_time = snap_time
+                self._baseline_requested = False
+            data = memoryview(buf)[:off]
+            # enqueue sends with SERVER_LATENCY (simulate send delay); one
+            # entry per snapshot, shared by all recipients
+            send_time = current_time() + SERVER_LATENCY
+            new_head = False
+            if addrs:
+                with self.out_lock:
+                    new_head = not self.outbound_queue or send_time < self.outbound_queue[0][0]
+                    heapq.heappush(self.outbound_queue, (send_time, next(self._queue_seq), data, list(addrs)))
+            else:
+                self._free_snap_bufs.append(buf)
+            if new_head:
+                # the UDP loop may be sleeping past send_time
+                try:
+                    self._wake_w.send(b'\0')
+                except OSError:
+                    pass
             elapsed = current_time() - t0
             to_sleep = interval - elapsed
             if to_sleep > 0:
                 time.sleep(to_sleep)
 
+    def pack_baseline(self, buf, seq, snap_time, players, coins):
+        # full snapshot into buf; returns the encoded length
+        SNAP_HDR.pack_into(buf, 0, MSG_SNAPSHOT, seq, snap_time, len(players), len(coins))
+        off = SNAP_HDR.size
+        for pid, (x, y, score) in players.items():
+            PLAYER.pack_into(buf, off, pid, x, y, score)
+            off += PLAYER.size
+        for cid, (x, y) in coins.items():
+            COIN.pack_into(buf, off, cid, x, y)
+            off += COIN.size
+        return off
+
+    def pack_delta(self, buf, seq, base, snap_time, players, coins):
+        # changes since the baseline into buf; returns the encoded
+        # length, or None if the delta would not fit into one datagram
+        base_seq, base_players, base_coins = base
+        changed = [(pid, st) for pid, st in players.items() if base_players.get(pid) != st]
+        gone_players = [pid for pid in base_players if pid not in players]
+        added = [(cid, st) for cid, st in coins.items() if cid not in base_coins]
+        gone_coins = [cid for cid in base_coins if cid not in coins]
+        size = (DELTA_HDR.size + len(changed) * PLAYER.size + len(added) * COIN.size
+                + (len(gone_players) + len(gone_coins)) * ID.size)
+        if size > MAX_SNAP_SIZE:
+            return None
+        DELTA_HDR.pack_into(buf, 0, MSG_DELTA, seq, base_seq, snap_time,
+                            len(changed), len(gone_players), len(added), len(gone_coins))
+        off = DELTA_HDR.size
+        for pid, (x, y, score) in changed:
+            PLAYER.pack_into(buf, off, pid, x, y, score)
+            off += PLAYER.size
+        for pid in gone_players:
+            ID.pack_into(buf, off, pid)
+            off += ID.size
+        for cid, (x, y) in added:
+            COIN.pack_into(buf, off, cid, x, y)
+            off += COIN.size
+        for cid in gone_coins:
+            ID.pack_into(buf, off, cid)
+            off += ID.size
+        return off
+
 if __name__ == "__main__":
     s = Server()
     s.start()